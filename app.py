@@ -7,8 +7,14 @@ from paper_pal.chat import (
     MethodologyPrompt,
     KeyFindingsPrompt,
 )
+from paper_pal.profiling import Profiler, stage
+from paper_pal.references import CrossReferencer, ReferenceLibrary
+from paper_pal.workspace import DEFAULT_COMPARISON, Paper, Workspace, display_names
 
+import asyncio
+import os
 from pathlib import Path
+from typing import Iterator
 from tkinter import Tk, filedialog
 
 import panel as pn
@@ -18,27 +24,57 @@ pn.extension()
 
 
 class Session:
-    def __init__(self, provider: APIProvider, pdf_data: bytes | None = None, pdf_path: Path | None = None) -> None:
+    def __init__(self, provider: APIProvider, workspace: Workspace | None = None) -> None:
         self.provider = provider
-        self.pdf_data = pdf_data
-        self.pdf_path = pdf_path
+        self.providers: dict[str, APIProvider] = {}
+        self.workspace = workspace if workspace is not None else Workspace()
+        self.paper: Paper | None = None
+        self.profiler = Profiler.from_env()
+
+    @property
+    def pdf_data(self) -> bytes | None:
+        return self.workspace.open(self.paper).data if self.paper is not None else None
+
+    @property
+    def pdf_path(self) -> Path | None:
+        return self.paper.path if self.paper is not None else None
+
+    def stream_response(self, prompt: str, history: list[dict]) -> Iterator[str]:
+        if self.paper is None:
+            return self.provider.stream_response(prompt, history, None)
+        return self.workspace.open(self.paper).stream_response(self.provider, prompt, history)
 
     def update_provider(self, event) -> None:
-        self.provider = load_provider(event.new)
+        # Keep one instance per provider, so switching back and forth does not open new connection pools.
+        self.providers[event.old] = self.provider
+        self.provider = self.providers.get(event.new) or load_provider(event.new)
 
     def update_model(self, event) -> None:
         self.provider.model = event.new
 
+    def update_profiling(self, event) -> None:
+        self.profiler.enabled = event.new
+
 
 providers = list_available_providers()
 session = Session(load_provider(providers[0]))
+cross_referencer = CrossReferencer(ReferenceLibrary(os.getenv("PAPERPAL_LIBRARY", "./library")))
 
 # Header
 title = pn.pane.Str("PaperPal 🤝", styles={"font-size": "2em", "margin-right": "auto", "color": "White"})
 btn_transfer = pn.widgets.ButtonIcon(icon="transfer", active_icon="transfer", size="2em", styles={"color": "White"})
 btn_help = pn.widgets.ButtonIcon(icon="help", active_icon="help", size="2em", styles={"color": "White"})
+tgl_profiling = pn.widgets.ToggleIcon(
+    icon="stopwatch",
+    active_icon="stopwatch-filled",
+    value=session.profiler.enabled,
+    size="2em",
+    description="Profile requests",
+    styles={"color": "White"},
+)
 header = pn.FlexBox(
     title,
+    tgl_profiling,
     btn_transfer,
     align_content="center",
     align_items="center",
@@ -53,12 +89,37 @@ header.servable()
 
 
 # Chat panel
-def response_callback(input_message: str, input_user: str, instance: pn.chat.ChatInterface) -> str:
-    history = instance.serialize()
-    prompt = history.pop()  # The last item of the history is the current prompt.
-    response_message = session.provider.generate_response(prompt["content"], history, session.pdf_data)
-
-    return response_message
+def stream_response(instance: pn.chat.ChatInterface, chunks: asyncio.Queue, loop: asyncio.AbstractEventLoop) -> None:
+    # Runs in a single worker thread, so the profiler sees all stages of the request.
+    try:
+        with session.profiler.request("response_callback"):
+            with stage("serialize_history"):
+                history = instance.serialize()
+            prompt = history.pop()  # The last item of the history is the current prompt.
+            with stage("generate_response"):
+                response = session.stream_response(prompt["content"], history)
+                with stage("first_chunk"):
+                    chunk = next(response, None)
+                with stage("stream"):
+                    while chunk is not None:
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                        chunk = next(response, None)
+    except Exception as e:
+        loop.call_soon_threadsafe(chunks.put_nowait, e)
+    finally:
+        loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+
+async def response_callback(input_message: str, input_user: str, instance: pn.chat.ChatInterface):
+    chunks: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(asyncio.to_thread(stream_response, instance, chunks, asyncio.get_running_loop()))
+    response_message = ""
+    while (chunk := await chunks.get()) is not None:
+        if isinstance(chunk, Exception):
+            raise chunk
+        response_message += chunk
+        yield response_message
+    await producer
 
 
 sct_provider = pn.widgets.Select(options=providers, sizing_mode="stretch_width")
@@ -74,7 +135,8 @@ chat_interface = pn.chat.ChatInterface(
     message_params={"show_reaction_icons": False},
     sizing_mode="stretch_height",
 )
-chat_panel = pn.Column(pn.Row(sct_provider, sct_model), chat_interface)
+mch_papers = pn.widgets.MultiChoice(placeholder="Select papers to compare", options={}, sizing_mode="stretch_width")
+chat_panel = pn.Column(pn.Row(sct_provider, sct_model), mch_papers, chat_interface)
 
 # Control panel
 btn_select_pdf = pn.widgets.Button(
@@ -103,6 +165,16 @@ btn_key_findings = pn.widgets.Button(
     icon_size="0.9em",
     description="Identify results and key findings",
 )
+btn_cross_reference = pn.widgets.Button(
+    icon="link",
+    icon_size="0.9em",
+    description="Summarize referenced papers",
+)
+btn_compare = pn.widgets.Button(
+    icon="arrows-diff",
+    icon_size="0.9em",
+    description="Compare selected papers",
+)
 control_panel = pn.Column(
     btn_select_pdf,
     pn.Spacer(height=10),
@@ -110,6 +182,8 @@ control_panel = pn.Column(
     btn_problem_statement,
     btn_methodology_breakdown,
     btn_key_findings,
+    btn_cross_reference,
+    btn_compare,
     width=50,
 )
 
@@ -144,19 +218,29 @@ def select_file(event) -> None:
     root = Tk()
     root.withdraw()
     root.call("wm", "attributes", ".", "-topmost", True)
-    file_path = Path(filedialog.askopenfilename())
-    session.pdf_data = file_path.read_bytes()
-    session.pdf_path = file_path
+    selection = filedialog.askopenfilename(filetypes=[("PDF files", "*.pdf")])
+    if not selection:  # The dialog was cancelled.
+        return
+    file_path = Path(selection)
+    if file_path.suffix.lower() != ".pdf" or not file_path.is_file():
+        return
+
+    paper = session.workspace.add(file_path)
+    with session.profiler.request("select_file"), stage("read_pdf"):
+        session.workspace.open(paper)
+    session.paper = paper
+    papers = session.workspace.papers
+    mch_papers.options = dict(zip(display_names(papers), [str(item.path) for item in papers]))
     chat_interface.clear()
 
-    if file_path.suffix == ".pdf":
-        for i, obj in enumerate(main_layout):
-            if isinstance(obj, pn.pane.PDF):
-                main_layout[i] = pn.pane.PDF(file_path, embed=True, sizing_mode="stretch_both")  # type: ignore
+    for i, obj in enumerate(main_layout):
+        if isinstance(obj, pn.pane.PDF):
+            main_layout[i] = pn.pane.PDF(file_path, embed=True, sizing_mode="stretch_both")  # type: ignore
 
 
 def update_sct_provider(event) -> None:
     sct_model.options = session.provider.list_available_models()
+    sct_model.value = session.provider.model
 
 
 def summarize_paper(event) -> None:
@@ -188,6 +272,46 @@ def identify_results(event) -> None:
     chat_interface.send(message)
 
 
+def send_reference_message(text: str) -> None:
+    message = pn.chat.ChatMessage(text, user="Reference", avatar="🔗", show_reaction_icons=False)
+    chat_interface.send(message, respond=False)
+
+
+async def summarize_references(event) -> None:
+    if session.pdf_data is None:
+        send_reference_message("Load a paper first to summarize the papers it references.")
+        return
+
+    # Pull each finished summary in a worker thread so the UI is updated as soon as it arrives.
+    summaries = cross_referencer.summarize(session.provider, session.pdf_data)
+    found = False
+    try:
+        while (item := await asyncio.to_thread(next, summaries, None)) is not None:
+            reference, summary = item
+            found = True
+            send_reference_message(f"**{reference.label}**\n\n{summary}")
+    except Exception as e:
+        send_reference_message(f"Could not summarize the referenced papers: {e}")
+        return
+
+    if not found:
+        send_reference_message("None of the referenced papers were found in the local library.")
+
+
+async def compare_papers(event) -> None:
+    papers = [session.workspace.add(path) for path in mch_papers.value]
+    if len(papers) < 2:
+        message = pn.chat.ChatMessage(
+            "Select at least two papers to compare.", user="Comparison", avatar="⚖️", show_reaction_icons=False
+        )
+        chat_interface.send(message, respond=False)
+        return
+
+    response = await asyncio.to_thread(session.workspace.compare, session.provider, DEFAULT_COMPARISON, papers)
+    message = pn.chat.ChatMessage(response, user="Comparison", avatar="⚖️", show_reaction_icons=False)
+    chat_interface.send(message, respond=False)
+
+
 # Actions
 btn_transfer.on_click(swap_panels)
 btn_select_pdf.on_click(select_file)
@@ -195,6 +319,9 @@ btn_paper_summary.on_click(summarize_paper)
 btn_problem_statement.on_click(extract_problem)
 btn_methodology_breakdown.on_click(break_down_methodology)
 btn_key_findings.on_click(identify_results)
+btn_cross_reference.on_click(summarize_references)
+btn_compare.on_click(compare_papers)
 sct_provider.param.watch(session.update_provider, "value")
 sct_provider.param.watch(update_sct_provider, "value")
 sct_model.param.watch(session.update_model, "value")
+tgl_profiling.param.watch(session.update_profiling, "value")
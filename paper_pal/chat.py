@@ -219,3 +219,102 @@ class QuestionPrompt:
             "mentioned in the section. Do not provide information from outside the "
             "given section."
         )
+
+
+class ReferenceSummaryPrompt:
+    """A class representing a prompt to summarize a paper cited by the paper the user is reading."""
+
+    def __init__(self, citation: str) -> None:
+        """Initializes the ReferenceSummaryPrompt with the citation of the referenced paper.
+
+        Args:
+            citation (str): The title or bibliography entry of the referenced paper.
+        """
+        self._citation = citation
+
+    @property
+    def role(self) -> str:
+        """Returns the role of the prompt, which is 'ReferenceSummary'."""
+        return "ReferenceSummary"
+
+    @property
+    def content(self) -> str:
+        """Provides the content for summarizing a referenced paper.
+
+        Returns:
+            str: A prompt asking for a background summary of the attached referenced paper.
+        """
+        return (
+            "The attached academic paper is cited by the paper the user is currently reading as:\n\n"
+            f"{self._citation}\n\n"
+            "Provide a concise summary of the attached paper that gives the user the background "
+            "they need without reading it. Focus on the problem it addresses, its main contribution, "
+            "and its key findings. The summary should be a few sentences long and easily understandable."
+        )
+
+
+class PaperExtractionPrompt:
+    """A class representing a prompt to extract the information of a single paper relevant to a comparison."""
+
+    def __init__(self, question: str) -> None:
+        """Initializes the PaperExtractionPrompt with the comparative question.
+
+        Args:
+            question (str): The question the papers are compared on.
+        """
+        self._question = question
+
+    @property
+    def role(self) -> str:
+        """Returns the role of the prompt, which is 'PaperExtraction'."""
+        return "PaperExtraction"
+
+    @property
+    def content(self) -> str:
+        """Provides the content for extracting the information relevant to a comparison from one paper.
+
+        Returns:
+            str: A prompt asking for the parts of the attached paper that are relevant to the question.
+        """
+        return (
+            "The attached academic paper is one of several papers that are being compared on the following "
+            f"question:\n\n{self._question}\n\n"
+            "Extract everything from the attached paper that is relevant to this question, such as the problem it "
+            "addresses, its methods, datasets, results, and limitations. Be concise and factual, and use bullet "
+            "points. Only report what is stated in the paper."
+        )
+
+
+class ComparisonPrompt:
+    """A class representing a prompt to compare several papers based on information extracted from each of them."""
+
+    def __init__(self, question: str, extractions: dict[str, str]) -> None:
+        """Initializes the ComparisonPrompt with the question and the per-paper extractions.
+
+        Args:
+            question (str): The question the papers are compared on.
+            extractions (dict[str, str]): The extracted information, keyed by the name of the paper.
+        """
+        self._question = question
+        self._extractions = extractions
+
+    @property
+    def role(self) -> str:
+        """Returns the role of the prompt, which is 'Comparison'."""
+        return "Comparison"
+
+    @property
+    def content(self) -> str:
+        """Provides the content for merging the per-paper extractions into a comparison.
+
+        Returns:
+            str: A prompt asking for a comparison of the papers.
+        """
+        papers = "\n\n".join(f"**Paper: {name}**\n{extraction}" for name, extraction in self._extractions.items())
+        return (
+            f"Answer the following question by comparing the papers below:\n\n{self._question}\n\n"
+            "For each paper, the information relevant to the question has already been extracted:\n\n"
+            f"{papers}\n\n"
+            "Compare the papers based *solely* on this information. Highlight their similarities and differences, "
+            "and refer to each paper by its name. The comparison should be clear, concise, and easily understandable."
+        )
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import hashlib
+from io import BytesIO
+
+from pypdf import PdfReader
+
+
+def pdf_hash(pdf_content: bytes) -> str:
+    """Compute a stable fingerprint of a PDF document.
+
+    Args:
+        pdf_content (bytes): The raw content of the PDF file.
+
+    Returns:
+        str: The SHA-256 hex digest of the PDF content.
+    """
+    return hashlib.sha256(pdf_content).hexdigest()
+
+
+def extract_text(pdf_content: bytes, max_pages: int | None = None) -> str:
+    """Extract the plain text of a PDF document.
+
+    Args:
+        pdf_content (bytes): The raw content of the PDF file.
+        max_pages (int | None): Only read the first `max_pages` pages if given.
+
+    Returns:
+        str: The text of all (or the first `max_pages`) pages, separated by newlines.
+    """
+    reader = PdfReader(BytesIO(pdf_content))
+    pages = reader.pages if max_pages is None else reader.pages[:max_pages]
+
+    return "\n".join(page.extract_text() or "" for page in pages)
+
+
+def extract_title(pdf_content: bytes) -> str | None:
+    """Read the document title from the PDF metadata.
+
+    Args:
+        pdf_content (bytes): The raw content of the PDF file.
+
+    Returns:
+        str | None: The title stored in the PDF metadata, or None if it is missing.
+    """
+    reader = PdfReader(BytesIO(pdf_content))
+    metadata = reader.metadata
+    title = metadata.title if metadata is not None else None
+
+    return title.strip() if title and title.strip() else None
@@ -1,4 +1,4 @@
-from typing import Protocol
+from typing import Callable, Iterator, Protocol
 
 
 class Prompt(Protocol):
@@ -28,4 +28,24 @@ class APIProvider(Protocol):
 
     def list_available_models(self) -> list[str]: ...
 
-    def generate_response(self, prompt: str, history: list[dict], pdf_content: bytes | None) -> str: ...
+    def upload_pdf(self, pdf_content: bytes) -> str | None: ...
+
+    def delete_pdf(self, pdf_file: str) -> None: ...
+
+    def generate_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> str: ...
+
+    def stream_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> Iterator[str]: ...
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+_local = threading.local()
+# cProfile and tracemalloc are process-wide, so only one request in the process is sampled at a time.
+_sampling = threading.Lock()
+
+
+class Profiler:
+    """Opt-in profiler that times the stages of a request and samples cProfile and tracemalloc snapshots.
+
+    For every profiled request a JSON line with the duration (and, if sampled, the memory delta) of each stage
+    is appended to 'stages.jsonl' in the output directory. Sampled requests additionally write a cProfile dump
+    ('<id>.prof'), the same profile as folded stacks for flame graph tools ('<id>.folded') and a tracemalloc
+    snapshot ('<id>.tracemalloc').
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.1, output_dir: Path | str = "./profiles") -> None:
+        """Initialize the profiler.
+
+        Args:
+            enabled (bool): Whether requests are profiled.
+            sample_rate (float): The fraction of profiled requests for which cProfile and tracemalloc are run.
+            output_dir (Path | str): The directory the profiling output is written to.
+
+        Raises:
+            ValueError: If the sample rate is not between 0 and 1.
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"Invalid sample rate: {sample_rate}")
+        self.enabled = enabled
+        self._sample_rate = sample_rate
+        self._output_dir = Path(output_dir)
+        self._writing = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Profiler:
+        """Create a profiler configured by the PAPERPAL_PROFILE* environment variables.
+
+        An invalid PAPERPAL_PROFILE_SAMPLE_RATE is reported and the default sample rate of 0.1 is used instead.
+
+        Returns:
+            Profiler: A profiler that is enabled if PAPERPAL_PROFILE is set to '1', 'true' or 'yes'.
+        """
+        value = os.getenv("PAPERPAL_PROFILE_SAMPLE_RATE", "0.1")
+        try:
+            sample_rate = float(value)
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("must be between 0 and 1")
+        except ValueError as e:
+            print(f"Error: Invalid PAPERPAL_PROFILE_SAMPLE_RATE {value!r}, using 0.1 instead: {e}")
+            sample_rate = 0.1
+
+        return cls(
+            enabled=os.getenv("PAPERPAL_PROFILE", "").lower() in ("1", "true", "yes"),
+            sample_rate=sample_rate,
+            output_dir=os.getenv("PAPERPAL_PROFILE_DIR", "./profiles"),
+        )
+
+    @property
+    def sample_rate(self) -> float:
+        """Get the fraction of profiled requests for which cProfile and tracemalloc are run.
+
+        Returns:
+            float: The sample rate between 0 and 1.
+        """
+        return self._sample_rate
+
+    @property
+    def output_dir(self) -> Path:
+        """Get the directory the profiling output is written to.
+
+        Returns:
+            Path: The output directory.
+        """
+        return self._output_dir
+
+    @contextmanager
+    def request(self, name: str) -> Iterator[None]:
+        """Profile a request. Stages entered with `stage` in the same thread are recorded as part of it.
+
+        Args:
+            name (str): The name of the request, e.g. the callback handling it.
+        """
+        if not self.enabled or getattr(_local, "trace", None) is not None:
+            yield
+            return
+
+        trace = _RequestTrace(name)
+        _local.trace = trace
+        sampling = None
+        start = time.perf_counter()
+        try:
+            if random.random() < self._sample_rate:
+                sampling = _start_sampling()
+                trace.sampled = sampling is not None
+            yield
+        finally:
+            trace.duration = time.perf_counter() - start
+            _local.trace = None
+            profile, snapshot = _stop_sampling(*sampling) if sampling is not None else (None, None)
+            self._write(trace, profile, snapshot)
+
+    def _write(
+        self, trace: _RequestTrace, profile: cProfile.Profile | None, snapshot: tracemalloc.Snapshot | None
+    ) -> None:
+        """Write the profiling output of a request to the output directory.
+
+        Args:
+            trace (_RequestTrace): The recorded stages of the request.
+            profile (cProfile.Profile | None): The cProfile profile if the request was sampled.
+            snapshot (tracemalloc.Snapshot | None): The tracemalloc snapshot if the request was sampled.
+        """
+        try:
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+            with self._writing, open(self._output_dir / "stages.jsonl", "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+            if profile is not None:
+                profile.dump_stats(self._output_dir / f"{trace.id}.prof")
+                with open(self._output_dir / f"{trace.id}.folded", "w", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {value}\n" for stack, value in folded_stacks(pstats.Stats(profile)))
+            if snapshot is not None:
+                snapshot.dump(str(self._output_dir / f"{trace.id}.tracemalloc"))
+        except Exception as e:
+            print(f"Error: Could not write profiling output to {self._output_dir}: {e}")
+
+
+def _start_sampling() -> tuple[cProfile.Profile, bool] | None:
+    """Start cProfile and, if it is not running yet, tracemalloc for the current request.
+
+    Returns:
+        tuple[cProfile.Profile, bool] | None: The running profile and whether tracemalloc was started by this call,
+            or None if another request is sampled or the profilers could not be started.
+    """
+    if not _sampling.acquire(blocking=False):
+        return None
+
+    started_tracemalloc = False
+    try:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+        profile = cProfile.Profile()
+        profile.enable()
+    except Exception as e:
+        # e.g. another profiling tool is already active.
+        print(f"Error: Could not start profiling: {e}")
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _sampling.release()
+        return None
+
+    return profile, started_tracemalloc
+
+
+def _stop_sampling(
+    profile: cProfile.Profile, started_tracemalloc: bool
+) -> tuple[cProfile.Profile | None, tracemalloc.Snapshot | None]:
+    """Stop the profilers started by `_start_sampling` and take a tracemalloc snapshot.
+
+    Args:
+        profile (cProfile.Profile): The running profile.
+        started_tracemalloc (bool): Whether tracemalloc was started for this request and must be stopped.
+
+    Returns:
+        tuple[cProfile.Profile | None, tracemalloc.Snapshot | None]: The profile and snapshot, or None for each
+            one that could not be collected.
+    """
+    snapshot = None
+    try:
+        profile.disable()
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+    except Exception as e:
+        print(f"Error: Could not stop profiling: {e}")
+        profile = None
+    finally:
+        if started_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _sampling.release()
+
+    return profile, snapshot
+
+
+class _RequestTrace:
+    """The stages recorded while profiling a single request."""
+
+    def __init__(self, name: str) -> None:
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.sampled = False
+        self.duration = 0.0
+        self.stack: list[str] = []
+        self.peaks: list[int] = []
+        self.stages: list[dict] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "request": self.name,
+            "sampled": self.sampled,
+            "seconds": self.duration,
+            "stages": self.stages,
+        }
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the request currently profiled in this thread. Does nothing if there is none.
+
+    Nested stages are recorded with their full path, e.g. 'response_callback;build_prompt'. For sampled requests
+    the change in traced memory and the peak traced memory during the stage are recorded as well.
+
+    Args:
+        name (str): The name of the stage.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    trace.stack.append(name)
+    path = ";".join(trace.stack)
+    memory_before = None
+    if trace.sampled and tracemalloc.is_tracing():
+        memory_before, peak = tracemalloc.get_traced_memory()
+        # Resetting the peak would lose it for the enclosing stage, so hand it up before.
+        if trace.peaks:
+            trace.peaks[-1] = max(trace.peaks[-1], peak)
+        trace.peaks.append(memory_before)
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {"stage": path, "seconds": time.perf_counter() - start}
+        if memory_before is not None:
+            memory_after, peak = tracemalloc.get_traced_memory()
+            peak = max(trace.peaks.pop(), peak)
+            if trace.peaks:
+                trace.peaks[-1] = max(trace.peaks[-1], peak)
+            record["memory_delta"] = memory_after - memory_before
+            record["memory_peak"] = peak - memory_before
+        trace.stages.append(record)
+        trace.stack.pop()
+
+
+def folded_stacks(
+    stats: pstats.Stats, max_depth: int = 64, min_fraction: float = 0.001, max_frames: int = 50_000
+) -> list[tuple[str, int]]:
+    """Convert cProfile statistics into folded stacks as consumed by flame graph tools.
+
+    cProfile only records caller/callee pairs, so the time of a function is split among its call paths in
+    proportion to the time each caller spent in it. The number of call paths grows exponentially with the fan-in of
+    the call graph, so calls that account for less than `min_fraction` of the total time are not expanded and their
+    time is counted as self time of the caller. At most `max_frames` frames are expanded in total.
+
+    Args:
+        stats (pstats.Stats): The cProfile statistics.
+        max_depth (int): The maximum depth of a stack.
+        min_fraction (float): The fraction of the total time below which a call is not expanded.
+        max_frames (int): The maximum number of frames expanded.
+
+    Returns:
+        list[tuple[str, int]]: Pairs of a ';'-separated call stack and the self time spent in it in microseconds.
+    """
+    raw_stats = stats.stats  # type: ignore[attr-defined]
+    callees: dict[tuple, dict[tuple, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller][func] = cumulative
+
+    roots = [(func, total) for func, (_, _, _, total, callers) in raw_stats.items() if not callers]
+    threshold = sum(total for _, total in roots) * min_fraction
+    folded: dict[str, float] = defaultdict(float)
+    frames = 0
+
+    def walk(func: tuple, stack: list[str], cumulative: float) -> None:
+        nonlocal frames
+        frames += 1
+        _, _, own, total, _ = raw_stats[func]
+        stack = stack + [_frame_name(func)]
+        share = cumulative / total if total > 0 else 0.0
+        self_time = own * share
+        for callee, callee_cumulative in callees[func].items():
+            if callee not in raw_stats or _frame_name(callee) in stack:
+                continue
+            time_in_callee = callee_cumulative * share
+            if len(stack) < max_depth and time_in_callee >= threshold and frames < max_frames:
+                walk(callee, stack, time_in_callee)
+            else:
+                self_time += time_in_callee
+        folded[";".join(stack)] += self_time
+
+    for func, total in roots:
+        walk(func, [], total)
+
+    return [(stack, round(seconds * 1e6)) for stack, seconds in folded.items() if round(seconds * 1e6) > 0]
+
+
+def _frame_name(func: tuple) -> str:
+    """Format a cProfile function key as a frame name.
+
+    Args:
+        func (tuple): The (filename, line number, function name) key.
+
+    Returns:
+        str: The frame name, e.g. 'app.py:42(select_file)'.
+    """
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{Path(filename).name}:{line}({name})"
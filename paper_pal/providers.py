@@ -1,14 +1,26 @@
 from __future__ import annotations
 
+from paper_pal.documents import extract_text
 from paper_pal.interfaces import APIProvider
+from paper_pal.profiling import stage
 
+import base64
+import itertools
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
 from pathlib import Path
 from abc import ABC
+from typing import Callable, Iterator
 from dotenv import load_dotenv
 
+import httpx
+
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=Path(".env"))
@@ -22,6 +34,7 @@ def get_api_keys() -> dict:
     """
     api_keys = {
         "Google Gemini": os.getenv("GEMINI_API_KEY"),
+        "OpenAI Compatible": os.getenv("OPENAI_COMPATIBLE_API_KEY"),
     }
 
     return {key: value for key, value in api_keys.items() if value is not None}
@@ -33,9 +46,10 @@ def list_available_providers() -> list:
     Returns:
         list: A list of available providers with valid API keys.
     """
-    providers = ["Google Gemini"]
+    providers = ["Google Gemini", "OpenAI Compatible"]
+    api_keys = get_api_keys()
 
-    return list(set(providers) & set(get_api_keys()))
+    return [provider for provider in providers if provider in api_keys]
 
 
 def load_provider(name: str) -> APIProvider:
@@ -52,6 +66,7 @@ def load_provider(name: str) -> APIProvider:
     """
     providers = {
         "Google Gemini": GoogleGemini,
+        "OpenAI Compatible": OpenAICompatible,
     }
 
     api_key = get_api_keys()[name]
@@ -141,22 +156,79 @@ class BaseProvider(ABC, APIProvider):
         """
         raise NotImplementedError
 
-    def generate_response(self, prompt: str, history: list[dict], pdf_content: bytes | None) -> str:
+    def upload_pdf(self, pdf_content: bytes) -> str | None:
+        """Upload a PDF to the provider so that later requests can reference it instead of sending its content.
+
+        Providers without file storage return None, in which case the PDF content is sent with every request.
+
+        Args:
+            pdf_content (bytes): The PDF content to upload.
+
+        Returns:
+            str | None: A reference to the uploaded file, or None if the provider does not support uploads.
+        """
+        return None
+
+    def delete_pdf(self, pdf_file: str) -> None:
+        """Delete a PDF uploaded with `upload_pdf`.
+
+        Args:
+            pdf_file (str): The reference to the uploaded file.
+        """
+        return None
+
+    def generate_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> str:
         """Generate a response based on the provided prompt and history.
 
         Args:
             prompt (str): The prompt for which to generate a response.
             history (list[dict]): The conversation history.
             pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_file (str | None): Optional reference to a PDF uploaded with `upload_pdf`, used instead of the content.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF, used by providers
+                that cannot read PDFs instead of extracting the text themselves.
 
         Returns:
             str: The generated response from the API provider.
 
         Raises:
+            FileNotFoundError: If the uploaded file no longer exists.
             NotImplementedError: If not implemented in the subclass.
         """
         raise NotImplementedError
 
+    def stream_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> Iterator[str]:
+        """Generate a response and yield it in chunks as it is generated.
+
+        Providers without streaming support yield the whole response at once.
+
+        Args:
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_file (str | None): Optional reference to a PDF uploaded with `upload_pdf`, used instead of the content.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF, used by providers
+                that cannot read PDFs instead of extracting the text themselves.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        yield self.generate_response(prompt, history, pdf_content, pdf_file=pdf_file, pdf_text=pdf_text)
+
     def list_available_models(self) -> list[str]:
         """List the models available for the API provider.
 
@@ -202,33 +274,451 @@ class GoogleGemini(BaseProvider):
             "gemini-2.0-flash-thinking-exp-01-21",
         ]
 
-    def generate_response(self, prompt: str, history: list[dict], pdf_content: bytes | None) -> str:
+    def upload_pdf(self, pdf_content: bytes) -> str | None:
+        """Upload a PDF with the Gemini Files API.
+
+        Args:
+            pdf_content (bytes): The PDF content to upload.
+
+        Returns:
+            str | None: The URI of the uploaded file.
+        """
+        file = self._client.files.upload(
+            file=BytesIO(pdf_content),
+            config=types.UploadFileConfig(mime_type="application/pdf"),
+        )
+
+        return file.uri
+
+    def delete_pdf(self, pdf_file: str) -> None:
+        """Delete a PDF uploaded with the Gemini Files API.
+
+        Args:
+            pdf_file (str): The URI of the uploaded file.
+        """
+        self._client.files.delete(name="files/" + pdf_file.rstrip("/").rsplit("/", 1)[-1])
+
+    def generate_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> str:
         """Generate a response based on the provided prompt, history, and optional PDF content.
 
         Args:
             prompt (str): The prompt for which to generate a response.
             history (list[dict]): The conversation history.
             pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_file (str | None): Optional URI of a PDF uploaded with `upload_pdf`, used instead of the content.
+            pdf_text (Callable[[], str] | None): Unused, as Gemini reads PDFs.
 
         Returns:
             str: The generated response from the Google Gemini API.
+
+        Raises:
+            FileNotFoundError: If the uploaded file no longer exists, e.g. because it expired.
         """
-        content = f"<START | history>{history}<END | history>\n" + prompt
-        if pdf_content is not None:
-            contents = [
-                types.Part.from_bytes(
-                    data=pdf_content,
-                    mime_type="application/pdf",
-                ),
-                content,
-            ]
-        else:
-            contents = content
-
-        response = self._client.models.generate_content(
-            model=self._model,
-            config=types.GenerateContentConfig(system_instruction=self._system_instructions),
-            contents=contents,
-        )
+        with stage("build_prompt"):
+            content = f"<START | history>{history}<END | history>\n" + prompt
+
+        with stage("build_request"):
+            if pdf_file is not None:
+                contents = [
+                    types.Part.from_uri(
+                        file_uri=pdf_file,
+                        mime_type="application/pdf",
+                    ),
+                    content,
+                ]
+            elif pdf_content is not None:
+                contents = [
+                    types.Part.from_bytes(
+                        data=pdf_content,
+                        mime_type="application/pdf",
+                    ),
+                    content,
+                ]
+            else:
+                contents = content
+            config = types.GenerateContentConfig(system_instruction=self._system_instructions)
+
+        with stage("network"):
+            try:
+                response = self._client.models.generate_content(
+                    model=self._model,
+                    config=config,
+                    contents=contents,
+                )
+            except errors.ClientError as e:
+                # Gemini reports deleted or expired files as not found or, in most cases, as not accessible.
+                if pdf_file is not None and (e.code == 404 or (e.code == 403 and "file" in str(e.message).lower())):
+                    raise FileNotFoundError(f"Uploaded file not found: {pdf_file}") from e
+                raise
 
         return response.text if response.text else "No response from the model."
+
+
+class OpenAICompatible(BaseProvider):
+    """Implementation of a provider for servers with an OpenAI-compatible API, such as vLLM or llama.cpp.
+
+    Requests are sent through a pooled HTTP client that keeps connections alive between requests. If several base
+    URLs are configured, each request goes to the server with the fewest requests in flight that serves the current
+    model. If a server cannot be reached, the request is sent to the next server, and the failed server is skipped
+    until its models are listed again, at most every `RETRY_AFTER` seconds. PDFs are sent as file parts; servers that
+    reject file parts get the extracted text of the PDF instead.
+    """
+
+    RETRY_AFTER = 30.0
+    PDF_REJECTED_STATUS_CODES = (400, 415, 422)
+    PDF_REJECTED_MARKERS = ("file", "pdf", "content type", "content_type", "part type", "content[].type")
+
+    def __init__(self, api_key: str, base_urls: list[str] | None = None, client: httpx.Client | None = None) -> None:
+        """Initialize the provider with the provided API key.
+
+        Args:
+            api_key (str): The API key sent as bearer token. Use any value, e.g. 'EMPTY', if the servers do not
+                require authentication.
+            base_urls (list[str] | None): The base URLs of the servers, e.g. 'http://localhost:8000/v1'. Defaults
+                to the comma-separated OPENAI_COMPATIBLE_BASE_URLS environment variable.
+            client (httpx.Client | None): Optional HTTP client to use instead of the default pooled client.
+        """
+        if base_urls is None:
+            base_urls = os.getenv("OPENAI_COMPATIBLE_BASE_URLS", "http://localhost:8000/v1").split(",")
+        self._base_urls = [url.strip().rstrip("/") for url in base_urls if url.strip()]
+        self._client = client or httpx.Client(
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0),
+            timeout=httpx.Timeout(300.0, connect=5.0),
+        )
+        self._lock = threading.Lock()
+        self._in_flight = {url: 0 for url in self._base_urls}
+        self._rotation = itertools.count()
+        self._models_by_url: dict[str, list[str]] = {}
+        self._failed_at: dict[str, float] = {}
+        self._refreshing = threading.Lock()
+        self._rejects_pdf: set[str] = set()
+        super().__init__(api_key)
+
+    @property
+    def name(self) -> str:
+        """Get the name of the OpenAI-compatible provider, including the model name.
+
+        Returns:
+            str: The name of the provider, including the current model.
+        """
+        return f"OpenAI Compatible | {self.model}"
+
+    def list_available_models(self) -> list[str]:
+        """List the models served by the configured servers. Servers are queried once, and failed servers again after
+        `RETRY_AFTER` seconds.
+
+        Returns:
+            list[str]: The names of the models served by at least one of the servers.
+
+        Raises:
+            ConnectionError: If none of the servers serves any model.
+        """
+        self._refresh_models()
+        with self._lock:
+            models = list(dict.fromkeys(model for models in self._models_by_url.values() for model in models))
+        if not models:
+            raise ConnectionError(f"No models available from {', '.join(self._base_urls)}")
+
+        return models
+
+    def _refresh_models(self, wait: bool = True) -> None:
+        """Query the models of the servers that were not queried yet or failed more than `RETRY_AFTER` seconds ago.
+
+        Args:
+            wait (bool): Whether to wait for a refresh in progress in another thread instead of skipping it.
+        """
+        if not self._refreshing.acquire(blocking=wait):
+            return
+
+        try:
+            now = time.monotonic()
+            with self._lock:
+                urls = [
+                    url
+                    for url in self._base_urls
+                    if url not in self._models_by_url
+                    and (url not in self._failed_at or now - self._failed_at[url] >= self.RETRY_AFTER)
+                ]
+            for url in urls:
+                try:
+                    response = self._client.get(f"{url}/models")
+                    response.raise_for_status()
+                    models = [model["id"] for model in response.json()["data"]]
+                except (httpx.HTTPError, KeyError, ValueError) as e:
+                    print(f"Error: Could not list the models of {url}: {e}")
+                    with self._lock:
+                        self._failed_at[url] = time.monotonic()
+                    continue
+                with self._lock:
+                    self._models_by_url[url] = models
+                    self._failed_at.pop(url, None)
+        finally:
+            self._refreshing.release()
+
+    def _mark_failed(self, url: str) -> None:
+        """Skip a server that could not be reached until its models are listed again.
+
+        Args:
+            url (str): The base URL of the server.
+        """
+        with self._lock:
+            self._models_by_url.pop(url, None)
+            self._failed_at[url] = time.monotonic()
+
+    def close(self) -> None:
+        """Close the connections of the HTTP client."""
+        self._client.close()
+
+    def generate_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> str:
+        """Generate a response based on the provided prompt, history, and optional PDF content.
+
+        Args:
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_file (str | None): Unused, as OpenAI-compatible servers do not support uploads.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF, sent to servers
+                that reject PDF file parts. Defaults to extracting the text from the PDF content.
+
+        Returns:
+            str: The generated response from the server.
+        """
+        with self._connect(prompt, history, pdf_content, pdf_text, stream=False) as response:
+            with stage("network"):
+                response.read()
+            response.raise_for_status()
+
+        text = response.json()["choices"][0]["message"]["content"]
+        return text if text else "No response from the model."
+
+    def stream_response(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_file: str | None = None,
+        pdf_text: Callable[[], str] | None = None,
+    ) -> Iterator[str]:
+        """Generate a response and yield it in chunks as the server streams it.
+
+        Args:
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_file (str | None): Unused, as OpenAI-compatible servers do not support uploads.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF, sent to servers
+                that reject PDF file parts. Defaults to extracting the text from the PDF content.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        with self._connect(prompt, history, pdf_content, pdf_text, stream=True) as response:
+            if response.is_error:
+                response.read()
+                response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line.removeprefix("data:").strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                chunk = choices[0].get("delta", {}).get("content")
+                if chunk:
+                    yield chunk
+
+    @contextmanager
+    def _connect(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_text: Callable[[], str] | None,
+        stream: bool,
+    ) -> Iterator[httpx.Response]:
+        """Send a chat completion request, trying the next server if the selected server cannot be reached.
+
+        The server counts as busy and the response stays open until the context is exited.
+
+        Args:
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF.
+            stream (bool): Whether the server should stream the response.
+
+        Yields:
+            httpx.Response: The response of the server.
+
+        Raises:
+            httpx.TransportError: If none of the servers can be reached.
+        """
+        self._refresh_models(wait=False)
+        tried: set[str] = set()
+        while True:
+            with self._select_server(exclude=tried) as url:
+                try:
+                    response = self._post(url, prompt, history, pdf_content, pdf_text, stream)
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    # The request did not reach the server, so it is safe to send it to another one.
+                    print(f"Error: Could not connect to {url}: {e}")
+                    self._mark_failed(url)
+                    tried.add(url)
+                    if len(tried) == len(self._base_urls):
+                        raise
+                    continue
+                try:
+                    yield response
+                finally:
+                    response.close()
+                return
+
+    @contextmanager
+    def _select_server(self, exclude: set[str] | None = None) -> Iterator[str]:
+        """Pick the server with the fewest requests in flight that serves the current model.
+
+        Ties are broken round-robin. Servers that could not be reached only serve requests if no other server
+        serves the model. The server counts as busy until the context is exited.
+
+        Args:
+            exclude (set[str] | None): Base URLs that must not be selected, e.g. because they already failed.
+
+        Yields:
+            str: The base URL of the selected server.
+        """
+        with self._lock:
+            available = [url for url in self._base_urls if url not in (exclude or set())]
+            candidates = [url for url in available if self._model in self._models_by_url.get(url, [])]
+            candidates = candidates or available
+            offset = next(self._rotation) % len(candidates)
+            rotated = candidates[offset:] + candidates[:offset]
+            url = min(rotated, key=lambda candidate: self._in_flight[candidate])
+            self._in_flight[url] += 1
+        try:
+            yield url
+        finally:
+            with self._lock:
+                self._in_flight[url] -= 1
+
+    def _post(
+        self,
+        url: str,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_text: Callable[[], str] | None,
+        stream: bool,
+    ) -> httpx.Response:
+        """Send a chat completion request, falling back to the PDF text if the server rejects PDF file parts.
+
+        The response body is not read, so the caller must read or stream it and close the response.
+
+        Args:
+            url (str): The base URL of the server.
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF.
+            stream (bool): Whether the server should stream the response.
+
+        Returns:
+            httpx.Response: The response of the server.
+        """
+        send_pdf = pdf_content is not None and url not in self._rejects_pdf
+        with stage("build_request"):
+            payload = self._build_payload(prompt, history, pdf_content, pdf_text, send_pdf, stream)
+            request = self._client.build_request("POST", f"{url}/chat/completions", json=payload)
+        with stage("network"):
+            response = self._client.send(request, stream=True)
+
+        if send_pdf and self._rejects_pdf_part(response):
+            with self._lock:
+                self._rejects_pdf.add(url)
+            return self._post(url, prompt, history, pdf_content, pdf_text, stream)
+
+        return response
+
+    def _rejects_pdf_part(self, response: httpx.Response) -> bool:
+        """Check whether an error response means that the server does not accept PDF file parts.
+
+        Other errors, such as an exceeded context length, must not switch the server to text mode.
+
+        Args:
+            response (httpx.Response): The response to a request with a PDF file part.
+
+        Returns:
+            bool: True if the server rejected the file part.
+        """
+        if response.status_code not in self.PDF_REJECTED_STATUS_CODES:
+            return False
+        response.read()  # Reading the error also returns the connection to the pool.
+        if response.status_code == 415:
+            return True
+        error = response.text.lower()
+
+        return any(marker in error for marker in self.PDF_REJECTED_MARKERS)
+
+    def _build_payload(
+        self,
+        prompt: str,
+        history: list[dict],
+        pdf_content: bytes | None,
+        pdf_text: Callable[[], str] | None,
+        send_pdf: bool,
+        stream: bool,
+    ) -> dict:
+        """Build the body of a chat completion request.
+
+        Args:
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            pdf_content (bytes | None): Optional PDF content to include in the request.
+            pdf_text (Callable[[], str] | None): Optional function returning the text of the PDF.
+            send_pdf (bool): Whether to send the PDF as a file part rather than as extracted text.
+            stream (bool): Whether the server should stream the response.
+
+        Returns:
+            dict: The JSON body of the request.
+        """
+        messages = []
+        if self._system_instructions:
+            messages.append({"role": "system", "content": self._system_instructions})
+        with stage("build_prompt"):
+            for message in history:
+                role = "assistant" if message.get("role") == "assistant" else "user"
+                messages.append({"role": role, "content": str(message.get("content", ""))})
+
+            if pdf_content is None:
+                content: str | list[dict] = prompt
+            elif send_pdf:
+                content = [
+                    {
+                        "type": "file",
+                        "file": {
+                            "filename": "paper.pdf",
+                            "file_data": "data:application/pdf;base64," + base64.b64encode(pdf_content).decode(),
+                        },
+                    },
+                    {"type": "text", "text": prompt},
+                ]
+            else:
+                text = pdf_text() if pdf_text is not None else extract_text(pdf_content)
+                content = f"<START | paper>{text}<END | paper>\n" + prompt
+            messages.append({"role": "user", "content": content})
+
+        return {"model": self._model, "messages": messages, "stream": stream}
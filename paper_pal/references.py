@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+from paper_pal.chat import ReferenceSummaryPrompt
+from paper_pal.documents import extract_text, extract_title, pdf_hash
+from paper_pal.interfaces import APIProvider
+
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Iterator
+
+DOI_PATTERN = re.compile(r"10\.\d{4,9}/[^\s\"<>]+", re.IGNORECASE)
+REFERENCES_HEADING = re.compile(
+    r"^[ \t]*(?:\d+\.?[ \t]+)?(?:references|bibliography|works cited|literature cited)[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+APPENDIX_HEADING = re.compile(
+    r"^[ \t]*(?:[A-Z]\.?[ \t]+)?(?:appendix|appendices|supplementary material)\b.*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+BRACKET_MARKER = re.compile(r"^[ \t]*\[\d+\][ \t]*", re.MULTILINE)
+NUMBER_MARKER = re.compile(r"^[ \t]*\d{1,3}\.[ \t]+", re.MULTILINE)
+SENTENCE_BREAK = re.compile(r"(?<=[a-z0-9\)\]\?!])\.\s+")
+QUOTED_TITLE = re.compile(r"[\"“](.+?)[,.]?[\"”]")
+YEAR_ONLY = re.compile(r"^\(?\d{4}[a-z]?\)?$")
+TITLE_MATCH_THRESHOLD = 0.9
+
+
+@dataclass(frozen=True)
+class Reference:
+    """A single entry of a paper's bibliography."""
+
+    raw: str
+    title: str | None = None
+    doi: str | None = None
+
+    @property
+    def label(self) -> str:
+        """Get a short human-readable label for the reference.
+
+        Returns:
+            str: The title if known, otherwise the (truncated) raw bibliography entry.
+        """
+        if self.title:
+            return self.title
+        return self.raw if len(self.raw) <= 80 else self.raw[:77] + "..."
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a title for comparison by lowercasing it and stripping punctuation.
+
+    Args:
+        title (str): The title to normalize.
+
+    Returns:
+        str: The normalized title.
+    """
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", title.lower()).split())
+
+
+def find_doi(text: str) -> str | None:
+    """Find the first DOI in a piece of text.
+
+    Args:
+        text (str): The text to search.
+
+    Returns:
+        str | None: The DOI in lowercase, or None if the text does not contain one.
+    """
+    match = DOI_PATTERN.search(text)
+    return match.group(0).rstrip(".,;)]").lower() if match else None
+
+
+def parse_references(text: str) -> list[Reference]:
+    """Parse the bibliography section of a paper into individual references.
+
+    The bibliography starts after the last 'References' (or similar) heading and ends at an appendix
+    heading if there is one. Entries are split on '[n]' markers, 'n.' markers or blank lines, in that order
+    of preference.
+
+    Args:
+        text (str): The plain text of the paper.
+
+    Returns:
+        list[Reference]: The references in the order they appear in the bibliography.
+    """
+    headings = list(REFERENCES_HEADING.finditer(text))
+    if not headings:
+        return []
+    section = text[headings[-1].end():]
+    appendix = APPENDIX_HEADING.search(section)
+    if appendix is not None:
+        section = section[:appendix.start()]
+
+    if len(BRACKET_MARKER.findall(section)) > 1:
+        entries = BRACKET_MARKER.split(section)
+    elif len(NUMBER_MARKER.findall(section)) > 1:
+        entries = NUMBER_MARKER.split(section)
+    else:
+        entries = re.split(r"\n[ \t]*\n", section)
+
+    references = []
+    for entry in entries:
+        entry = re.sub(r"-\n(?=[a-z])", "", entry)
+        entry = " ".join(entry.split())
+        if entry:
+            references.append(Reference(raw=entry, title=_guess_title(entry), doi=find_doi(entry)))
+
+    return references
+
+
+def _guess_title(entry: str) -> str | None:
+    """Guess the title of a bibliography entry.
+
+    Args:
+        entry (str): A single bibliography entry on one line.
+
+    Returns:
+        str | None: The guessed title, or None if no plausible title was found.
+    """
+    quoted = QUOTED_TITLE.search(entry)
+    if quoted is not None:
+        return quoted.group(1).strip()
+
+    entry = re.sub(r"(?:https?://|doi:)\S+", "", entry, flags=re.IGNORECASE)
+    segments = [segment.strip() for segment in SENTENCE_BREAK.split(entry)]
+    # The first segment holds the authors (and possibly the year), so the title is the next real sentence.
+    for segment in segments[1:]:
+        if not YEAR_ONLY.match(segment) and len(segment.split()) >= 2:
+            return segment.rstrip(".")
+
+    return None
+
+
+@dataclass(frozen=True)
+class LibraryEntry:
+    """A PDF in the local reference library together with its identifying metadata."""
+
+    path: Path
+    title: str | None = None
+    doi: str | None = None
+
+
+class ReferenceLibrary:
+    """A local directory of PDFs that bibliography entries are resolved against."""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: Path | str) -> None:
+        """Initialize the library. The directory is indexed lazily on first use, and again whenever the directory
+        or its 'index.json' file changes.
+
+        If the directory contains an 'index.json' file with a list of {"path", "title", "doi"} objects, it is
+        used instead of reading the metadata of every PDF.
+
+        Args:
+            directory (Path | str): The directory containing the PDFs.
+        """
+        self._directory = Path(directory)
+        self._entries: list[LibraryEntry] | None = None
+        self._signature: tuple[int | None, int | None] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def entries(self) -> list[LibraryEntry]:
+        """Get the indexed entries of the library, rebuilding the index if the library changed.
+
+        Returns:
+            list[LibraryEntry]: All PDFs in the library.
+        """
+        with self._lock:
+            signature = self._current_signature()
+            if self._entries is None or signature != self._signature:
+                self._entries = self._build_index()
+                self._signature = signature
+            return self._entries
+
+    def _current_signature(self) -> tuple[int | None, int | None]:
+        """Get the modification times of the library directory and its index file.
+
+        Adding, removing or renaming a PDF changes the modification time of the directory.
+
+        Returns:
+            tuple[int | None, int | None]: The modification times in nanoseconds, or None if missing.
+        """
+        signature = []
+        for path in (self._directory, self._directory / self.INDEX_FILE):
+            try:
+                signature.append(path.stat().st_mtime_ns)
+            except OSError:
+                signature.append(None)
+
+        return signature[0], signature[1]
+
+    def _build_index(self) -> list[LibraryEntry]:
+        """Index the PDFs in the library directory.
+
+        Returns:
+            list[LibraryEntry]: The entries read from 'index.json', or from the PDFs themselves if there is no
+                valid index file.
+        """
+        if not self._directory.is_dir():
+            return []
+
+        index_path = self._directory / self.INDEX_FILE
+        if index_path.is_file():
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+                return [
+                    LibraryEntry(
+                        path=self._directory / item["path"],
+                        title=item.get("title"),
+                        doi=item["doi"].lower() if item.get("doi") else None,
+                    )
+                    for item in items
+                ]
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Error: Could not read {index_path}, indexing the PDFs instead: {e}")
+
+        entries = []
+        for path in sorted(self._directory.glob("*.pdf")):
+            try:
+                pdf_content = path.read_bytes()
+                first_page = extract_text(pdf_content, max_pages=1)
+                title = extract_title(pdf_content) or next(
+                    (line.strip() for line in first_page.splitlines() if line.strip()), None
+                )
+            except Exception as e:
+                print(f"Error: Could not index {path}: {e}")
+                continue
+            entries.append(LibraryEntry(path=path, title=title, doi=find_doi(first_page)))
+
+        return entries
+
+    def resolve(self, reference: Reference) -> Path | None:
+        """Find the PDF of a reference in the library, matching by DOI first and by title second.
+
+        Args:
+            reference (Reference): The reference to resolve.
+
+        Returns:
+            Path | None: The path of the matching PDF, or None if the reference is not in the library.
+        """
+        if reference.doi is not None:
+            for entry in self.entries:
+                if entry.doi == reference.doi:
+                    return entry.path
+
+        if reference.title is None:
+            return None
+        title = normalize_title(reference.title)
+        best_path, best_ratio = None, TITLE_MATCH_THRESHOLD
+        for entry in self.entries:
+            if entry.title is None:
+                continue
+            ratio = SequenceMatcher(None, title, normalize_title(entry.title)).ratio()
+            if ratio >= best_ratio:
+                best_path, best_ratio = entry.path, ratio
+
+        return best_path
+
+
+class CrossReferencer:
+    """Summarizes the papers cited by a paper that are available in a local reference library."""
+
+    def __init__(self, library: ReferenceLibrary, max_workers: int = 4) -> None:
+        """Initialize the cross-referencer.
+
+        Args:
+            library (ReferenceLibrary): The library the bibliography is resolved against.
+            max_workers (int): The maximum number of summaries requested concurrently.
+        """
+        self._library = library
+        self._max_workers = max_workers
+        self._cache: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def summarize(self, provider: APIProvider, pdf_content: bytes) -> Iterator[tuple[Reference, str]]:
+        """Summarize all referenced papers of a paper that can be found in the library.
+
+        Summaries are requested concurrently and yielded as soon as they finish, so the order is not the order
+        of the bibliography. Summaries are cached per referenced paper and provider/model.
+
+        Args:
+            provider (APIProvider): The provider used to generate the summaries.
+            pdf_content (bytes): The PDF content of the paper whose references are summarized.
+
+        Yields:
+            tuple[Reference, str]: A reference and the summary of the referenced paper.
+        """
+        resolved: dict[Path, Reference] = {}
+        for reference in parse_references(extract_text(pdf_content)):
+            path = self._library.resolve(reference)
+            if path is not None and path not in resolved:
+                resolved[path] = reference
+
+        if not resolved:
+            return
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {
+                executor.submit(self._summarize_reference, provider, reference, path): reference
+                for path, reference in resolved.items()
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def _summarize_reference(self, provider: APIProvider, reference: Reference, path: Path) -> str:
+        """Summarize a single referenced paper, using the cache if possible.
+
+        Args:
+            provider (APIProvider): The provider used to generate the summary.
+            reference (Reference): The reference as it appears in the bibliography.
+            path (Path): The path of the referenced paper in the library.
+
+        Returns:
+            str: The summary, or an error message if the summary could not be generated.
+        """
+        try:
+            pdf_content = path.read_bytes()
+            key = (pdf_hash(pdf_content), provider.name)
+            with self._lock:
+                if key in self._cache:
+                    return self._cache[key]
+
+            prompt = ReferenceSummaryPrompt(reference.raw)
+            summary = provider.generate_response(prompt.content, [], pdf_content)
+        except Exception as e:
+            return f"Could not summarize this reference: {e}"
+
+        with self._lock:
+            self._cache[key] = summary
+
+        return summary
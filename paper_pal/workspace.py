@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+from paper_pal.chat import ComparisonPrompt, PaperExtractionPrompt
+from paper_pal.documents import extract_text, pdf_hash
+from paper_pal.interfaces import APIProvider
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+DEFAULT_COMPARISON = (
+    "How do these papers compare in terms of the problem they address, their methodology, and their key findings?"
+)
+
+
+def display_names(papers: list[Paper]) -> list[str]:
+    """Get names for papers that tell them apart, using as many parent folders as needed.
+
+    Args:
+        papers (list[Paper]): The papers to name.
+
+    Returns:
+        list[str]: The names of the papers, e.g. 'paper.pdf', or 'x/paper.pdf' and 'y/paper.pdf' for two papers
+            with the same file name.
+    """
+    names = []
+    for paper in papers:
+        others = [other.path.parts for other in papers if other.path != paper.path]
+        parts = paper.path.parts
+        count = 1
+        while count < len(parts) and any(other[-count:] == parts[-count:] for other in others):
+            count += 1
+        names.append("/".join(parts[-count:]) if count < len(parts) else str(paper.path))
+
+    return names
+
+
+class Paper:
+    """A paper in a workspace. Its content, text and provider file references are loaded lazily.
+
+    Uploaded files are re-uploaded after `UPLOAD_TTL` seconds, as providers delete them after a while (Gemini after
+    48 hours), and once more if a request reports that the uploaded file no longer exists.
+    """
+
+    UPLOAD_TTL = 47 * 60 * 60
+
+    def __init__(self, path: Path | str) -> None:
+        """Initialize the paper without reading it.
+
+        Args:
+            path (Path | str): The path of the PDF file.
+        """
+        self._path = Path(path)
+        self._data: bytes | None = None
+        self._hash: str | None = None
+        self._text: str | None = None
+        self._files: dict[str, tuple[APIProvider, str | None, float]] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        """Get the path of the PDF file.
+
+        Returns:
+            Path: The path of the PDF file.
+        """
+        return self._path
+
+    @property
+    def name(self) -> str:
+        """Get the name of the paper.
+
+        Returns:
+            str: The file name of the PDF.
+        """
+        return self._path.name
+
+    @property
+    def loaded(self) -> bool:
+        """Check whether the content of the paper is currently held in memory.
+
+        Returns:
+            bool: True if the paper is loaded.
+        """
+        return self._data is not None
+
+    @property
+    def data(self) -> bytes:
+        """Get the content of the PDF file, reading it on first access.
+
+        Returns:
+            bytes: The content of the PDF file.
+        """
+        return self.load()
+
+    def load(self) -> bytes:
+        """Read the content of the PDF file if it is not loaded yet.
+
+        Returns:
+            bytes: The content of the PDF file.
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = self._path.read_bytes()
+                self._hash = pdf_hash(self._data)
+            return self._data
+
+    @property
+    def hash(self) -> str:
+        """Get the SHA-256 hash of the PDF content.
+
+        Returns:
+            str: The hex digest of the PDF content.
+        """
+        with self._lock:
+            if self._hash is None:
+                self.load()
+            return self._hash  # type: ignore[return-value]
+
+    @property
+    def text(self) -> str:
+        """Get the plain text of the paper, extracting it on first access.
+
+        Returns:
+            str: The text of the paper.
+        """
+        with self._lock:
+            if self._text is None:
+                self._text = extract_text(self.data)
+            return self._text
+
+    def file_reference(self, provider: APIProvider, refresh: bool = False) -> str | None:
+        """Get a reference to the paper uploaded to the provider, uploading it on first access or once it expired.
+
+        Args:
+            provider (APIProvider): The provider the paper is uploaded to.
+            refresh (bool): Whether to upload the paper again, e.g. because the uploaded file no longer exists.
+
+        Returns:
+            str | None: The file reference, or None if the provider does not support uploads.
+        """
+        key = type(provider).__name__
+        with self._lock:
+            cached = self._files.get(key)
+            if refresh or cached is None or time.monotonic() - cached[2] > self.UPLOAD_TTL:
+                self._files[key] = (provider, provider.upload_pdf(self.data), time.monotonic())
+            return self._files[key][1]
+
+    def generate_response(self, provider: APIProvider, prompt: str, history: list[dict]) -> str:
+        """Generate a response about the paper, referencing the uploaded file if the provider supports uploads.
+
+        Args:
+            provider (APIProvider): The provider used to generate the response.
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+
+        Returns:
+            str: The generated response.
+        """
+        return "".join(self._request(provider, prompt, history, stream=False))
+
+    def stream_response(self, provider: APIProvider, prompt: str, history: list[dict]) -> Iterator[str]:
+        """Generate a response about the paper and yield it in chunks as it is generated.
+
+        Args:
+            provider (APIProvider): The provider used to generate the response.
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        yield from self._request(provider, prompt, history, stream=True)
+
+    def _request(self, provider: APIProvider, prompt: str, history: list[dict], stream: bool) -> Iterator[str]:
+        """Send a request about the paper, uploading it again once if the uploaded file no longer exists.
+
+        The PDF content is only sent if the provider does not support uploads.
+
+        Args:
+            provider (APIProvider): The provider used to generate the response.
+            prompt (str): The prompt for which to generate a response.
+            history (list[dict]): The conversation history.
+            stream (bool): Whether to stream the response or to yield it at once.
+
+        Yields:
+            str: The next chunk of the response.
+        """
+        for refresh in (False, True):
+            pdf_file = self.file_reference(provider, refresh=refresh)
+            pdf_content = self.data if pdf_file is None else None
+            options = {"pdf_file": pdf_file, "pdf_text": lambda: self.text}
+            started = False
+            try:
+                if stream:
+                    chunks = provider.stream_response(prompt, history, pdf_content, **options)
+                else:
+                    chunks = iter([provider.generate_response(prompt, history, pdf_content, **options)])
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+                return
+            except FileNotFoundError:
+                # Only retry if nothing was yielded yet, as the caller cannot take back chunks.
+                if refresh or started or pdf_file is None:
+                    raise
+
+    def unload(self) -> None:
+        """Release the content and text of the paper. Both are read again when needed; uploaded files are kept."""
+        with self._lock:
+            self._data = None
+            self._text = None
+
+    def delete_files(self) -> None:
+        """Delete the files uploaded to providers for this paper."""
+        with self._lock:
+            files = list(self._files.values())
+            self._files.clear()
+        for provider, pdf_file, _ in files:
+            if pdf_file is None:
+                continue
+            try:
+                provider.delete_pdf(pdf_file)
+            except Exception as e:
+                print(f"Error: Could not delete the uploaded file {pdf_file}: {e}")
+
+
+class Workspace:
+    """A set of papers that are kept loaded at the same time, so they can be switched between and compared.
+
+    At most `capacity` papers are held in memory. When another paper is loaded, the least recently used one is
+    unloaded; it stays in the workspace and is loaded again when it is used.
+    """
+
+    def __init__(self, capacity: int = 5, max_workers: int = 4) -> None:
+        """Initialize an empty workspace.
+
+        Args:
+            capacity (int): The maximum number of papers held in memory.
+            max_workers (int): The maximum number of papers processed concurrently by `compare`.
+
+        Raises:
+            ValueError: If the capacity is smaller than 1.
+        """
+        if capacity < 1:
+            raise ValueError(f"Invalid capacity: {capacity}")
+        self._capacity = capacity
+        self._max_workers = max_workers
+        self._papers: dict[Path, Paper] = {}
+        self._recent: OrderedDict[Path, Paper] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def papers(self) -> list[Paper]:
+        """Get the papers in the workspace in the order they were added.
+
+        Returns:
+            list[Paper]: The papers in the workspace.
+        """
+        return list(self._papers.values())
+
+    def add(self, path: Path | str) -> Paper:
+        """Add a paper to the workspace without loading it. Adding a paper twice returns the existing one.
+
+        Args:
+            path (Path | str): The path of the PDF file.
+
+        Returns:
+            Paper: The paper in the workspace.
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            if path not in self._papers:
+                self._papers[path] = Paper(path)
+            return self._papers[path]
+
+    def remove(self, paper: Paper) -> None:
+        """Remove a paper from the workspace, release its content and delete its uploaded files.
+
+        Args:
+            paper (Paper): The paper to remove.
+        """
+        with self._lock:
+            self._papers.pop(paper.path, None)
+            self._recent.pop(paper.path, None)
+        paper.unload()
+        paper.delete_files()
+
+    def open(self, paper: Paper) -> Paper:
+        """Load a paper and mark it as most recently used, unloading the least recently used papers if necessary.
+
+        Args:
+            paper (Paper): The paper to open.
+
+        Returns:
+            Paper: The loaded paper.
+        """
+        with self._lock:
+            self._recent[paper.path] = paper
+            self._recent.move_to_end(paper.path)
+            evicted = []
+            while len(self._recent) > self._capacity:
+                evicted.append(self._recent.popitem(last=False)[1])
+        for old_paper in evicted:
+            old_paper.unload()
+        paper.load()
+
+        return paper
+
+    def compare(
+        self, provider: APIProvider, question: str = DEFAULT_COMPARISON, papers: list[Paper] | None = None
+    ) -> str:
+        """Answer a comparative question about several papers.
+
+        Each paper is sent in its own request that extracts the information relevant to the question. These requests
+        run concurrently, and their results are merged in a final request that does not include any PDF.
+
+        Args:
+            provider (APIProvider): The provider used to generate the responses.
+            question (str): The question the papers are compared on.
+            papers (list[Paper] | None): The papers to compare. Defaults to all papers in the workspace.
+
+        Returns:
+            str: The comparison of the papers.
+        """
+        papers = list(dict.fromkeys(self.papers if papers is None else papers))
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = [executor.submit(self._extract, provider, question, paper) for paper in papers]
+            extractions = {name: future.result() for name, future in zip(display_names(papers), futures)}
+
+        prompt = ComparisonPrompt(question, extractions)
+        return provider.generate_response(prompt.content, [], None)
+
+    def _extract(self, provider: APIProvider, question: str, paper: Paper) -> str:
+        """Extract the information relevant to a comparative question from a single paper.
+
+        Args:
+            provider (APIProvider): The provider used to generate the response.
+            question (str): The question the papers are compared on.
+            paper (Paper): The paper to extract the information from.
+
+        Returns:
+            str: The extracted information, or an error message if the extraction failed.
+        """
+        prompt = PaperExtractionPrompt(question)
+        try:
+            return self.open(paper).generate_response(provider, prompt.content, [])
+        except Exception as e:
+            return f"Could not extract information from this paper: {e}"
@@ -0,0 +1,189 @@
+import cProfile
+import json
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from paper_pal.profiling import Profiler, folded_stacks, stage
+
+
+def busy_work() -> list[bytes]:
+    return [bytes(1024) for _ in range(1000)]
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self._tmp.name) / "profiles"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def read_records(self) -> list[dict]:
+        with open(self.output_dir / "stages.jsonl", "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False, sample_rate=1.0, output_dir=self.output_dir)
+        with profiler.request("callback"), stage("work"):
+            busy_work()
+
+        self.assertFalse(self.output_dir.exists())
+
+    def test_stage_without_request(self):
+        # Stages outside of a profiled request are no-ops
+        with stage("work"):
+            busy_work()
+
+    def test_timed_stages_without_sampling(self):
+        profiler = Profiler(enabled=True, sample_rate=0.0, output_dir=self.output_dir)
+        with profiler.request("callback"):
+            with stage("outer"):
+                with stage("inner"):
+                    busy_work()
+
+        records = self.read_records()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["request"], "callback")
+        self.assertFalse(records[0]["sampled"])
+        self.assertEqual([s["stage"] for s in records[0]["stages"]], ["outer;inner", "outer"])
+        self.assertNotIn("memory_delta", records[0]["stages"][0])
+        self.assertEqual(list(self.output_dir.glob("*.prof")), [])
+
+    def test_sampled_request(self):
+        profiler = Profiler(enabled=True, sample_rate=1.0, output_dir=self.output_dir)
+        with profiler.request("callback"):
+            with stage("allocate"):
+                data = busy_work()
+                with stage("nested"):
+                    pass
+        del data
+
+        (record,) = self.read_records()
+        self.assertTrue(record["sampled"])
+        nested, allocate = record["stages"]
+        self.assertGreater(allocate["memory_delta"], 1000 * 1024)
+        self.assertGreaterEqual(allocate["memory_peak"], allocate["memory_delta"])
+        self.assertIn("memory_delta", nested)
+
+        prefix = self.output_dir / record["id"]
+        self.assertTrue(prefix.with_suffix(".prof").is_file())
+        self.assertTrue(prefix.with_suffix(".tracemalloc").is_file())
+        folded = prefix.with_suffix(".folded").read_text(encoding="utf-8").splitlines()
+        self.assertTrue(any("(busy_work)" in line for line in folded))
+        for line in folded:
+            stack, value = line.rsplit(" ", 1)
+            self.assertGreater(int(value), 0)
+
+    @patch("paper_pal.profiling.random.random")
+    def test_sample_rate(self, mock_random):
+        profiler = Profiler(enabled=True, sample_rate=0.25, output_dir=self.output_dir)
+        for value in (0.1, 0.5):
+            mock_random.return_value = value
+            with profiler.request("callback"):
+                pass
+
+        self.assertEqual([record["sampled"] for record in self.read_records()], [True, False])
+
+    def test_request_is_recorded_on_error(self):
+        profiler = Profiler(enabled=True, sample_rate=0.0, output_dir=self.output_dir)
+        with self.assertRaises(RuntimeError):
+            with profiler.request("callback"), stage("network"):
+                raise RuntimeError("timeout")
+
+        (record,) = self.read_records()
+        self.assertEqual(record["stages"][0]["stage"], "network")
+
+    def test_concurrent_sampling_across_profilers(self):
+        # Two sessions with their own profilers sample at the same time
+        profilers = [Profiler(enabled=True, sample_rate=1.0, output_dir=self.output_dir) for _ in range(2)]
+        inside = threading.Barrier(2, timeout=5)
+        errors = []
+
+        def handle_request(profiler):
+            try:
+                with profiler.request("callback"), stage("work"):
+                    inside.wait()
+                    busy_work()
+                    inside.wait()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=handle_request, args=(profiler,)) for profiler in profilers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(record["sampled"] for record in self.read_records()), [False, True])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @patch("paper_pal.profiling.cProfile.Profile")
+    def test_profiler_failure_does_not_break_request(self, mock_profile):
+        mock_profile.return_value.enable.side_effect = ValueError("Another profiling tool is already active")
+        profiler = Profiler(enabled=True, sample_rate=1.0, output_dir=self.output_dir)
+
+        with patch("builtins.print"):
+            for _ in range(2):
+                with profiler.request("callback"), stage("work"):
+                    busy_work()
+
+        # Both requests are recorded, unsampled, and the next request on this thread is profiled again
+        self.assertEqual([record["sampled"] for record in self.read_records()], [False, False])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_invalid_sample_rate(self):
+        with self.assertRaises(ValueError):
+            Profiler(sample_rate=1.5)
+
+    @patch.dict("os.environ", {"PAPERPAL_PROFILE": "true", "PAPERPAL_PROFILE_SAMPLE_RATE": "0.5"})
+    def test_from_env(self):
+        profiler = Profiler.from_env()
+        self.assertTrue(profiler.enabled)
+        self.assertEqual(profiler.sample_rate, 0.5)
+
+    def test_from_env_with_invalid_sample_rate(self):
+        for value in ("often", "nan", "1.5", "-0.1"):
+            environ = {"PAPERPAL_PROFILE_SAMPLE_RATE": value}
+            with patch.dict("os.environ", environ), patch("builtins.print") as mock_print:
+                profiler = Profiler.from_env()
+
+            self.assertEqual(profiler.sample_rate, 0.1)
+            mock_print.assert_called_once()
+
+
+class TestFoldedStacks(unittest.TestCase):
+    def test_folded_stacks(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        busy_work()
+        profile.disable()
+
+        stacks = dict(folded_stacks(pstats.Stats(profile)))
+        self.assertTrue(any("(busy_work)" in stack for stack in stacks))
+        self.assertTrue(all(value > 0 for value in stacks.values()))
+
+    def test_exponential_fan_in_is_bounded(self):
+        # 40 layers of two functions that each call both functions of the next layer: 2**40 call paths
+        layers = [[("module.py", layer, f"f{layer}_{i}") for i in range(2)] for layer in range(40)]
+        raw_stats = {}
+        for depth, layer in enumerate(layers):
+            for func in layer:
+                callers = {caller: (1, 1, 0.5, 50.0 / 2**depth) for caller in layers[depth - 1]} if depth else {}
+                raw_stats[func] = (1, 1, 1.0, 100.0 / 2**depth, callers)
+        stats = MagicMock(stats=raw_stats)
+
+        start = time.perf_counter()
+        stacks = folded_stacks(stats)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertGreater(len(stacks), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
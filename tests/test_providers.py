@@ -1,6 +1,15 @@
+import json
+import socket
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
-from paper_pal.providers import get_api_keys, list_available_providers, load_provider
+
+import httpx
+from google.genai import errors
+
+from helpers import make_pdf
+from paper_pal.providers import GoogleGemini, OpenAICompatible, get_api_keys, list_available_providers, load_provider
 
 
 class TestApiFunctions(unittest.TestCase):
@@ -9,7 +18,7 @@ class TestApiFunctions(unittest.TestCase):
         # Test for API key retrieval when the key is set in the environment variable
         mock_getenv.return_value = "test_api_key"
         api_keys = get_api_keys()
-        self.assertEqual(api_keys, {"Google Gemini": "test_api_key"})
+        self.assertEqual(api_keys, {"Google Gemini": "test_api_key", "OpenAI Compatible": "test_api_key"})
 
         # Test for API key retrieval when the key is not set in the environment variable
         mock_getenv.return_value = None
@@ -25,6 +34,11 @@ class TestApiFunctions(unittest.TestCase):
         available_providers = list_available_providers()
         self.assertEqual(available_providers, ["Google Gemini"])
 
+        # Test that the providers are listed in a fixed order
+        mock_get_api_keys.return_value = {"OpenAI Compatible": "test_api_key", "Google Gemini": "test_api_key"}
+        available_providers = list_available_providers()
+        self.assertEqual(available_providers, ["Google Gemini", "OpenAI Compatible"])
+
         # Test the available providers list when the API key is not set
         mock_get_api_keys.return_value = {}
         available_providers = list_available_providers()
@@ -50,5 +64,273 @@ class TestApiFunctions(unittest.TestCase):
             load_provider("Invalid Provider")
 
 
+class StubServer:
+    """A local OpenAI-compatible server that records the requests it receives."""
+
+    def __init__(self, models: list[str], accepts_pdf: bool = True, port: int = 0) -> None:
+        self.models = models
+        self.accepts_pdf = accepts_pdf
+        self.errors: list[tuple[int, dict]] = []
+        self.requests: list[dict] = []
+        self.connections = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.received = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.send_json(200, {"data": [{"id": model} for model in stub.models]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(body)
+                stub.received.set()
+                stub.release.wait(timeout=5)
+
+                if stub.errors:
+                    self.send_json(*stub.errors.pop(0))
+                    return
+
+                content = body["messages"][-1]["content"]
+                if isinstance(content, list) and not stub.accepts_pdf:
+                    self.send_json(400, {"error": "file parts are not supported"})
+                    return
+
+                if not body["stream"]:
+                    self.send_json(200, {"choices": [{"message": {"role": "assistant", "content": "Hello world"}}]})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in ("Hello", " world"):
+                    event = json.dumps({"choices": [{"delta": {"content": chunk}}]})
+                    self.write_chunk(f"data: {event}\n\n")
+                self.write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def write_chunk(self, text: str) -> None:
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        self.port = self._server.server_port
+        self.url = f"http://127.0.0.1:{self.port}/v1"
+
+    def stop(self) -> None:
+        self.release.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TestOpenAICompatible(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(["local-model"])
+        self.provider = OpenAICompatible("test_api_key", base_urls=[self.server.url])
+
+    def tearDown(self):
+        self.provider.close()
+        self.server.stop()
+
+    def test_models(self):
+        self.assertEqual(self.provider.list_available_models(), ["local-model"])
+        self.assertEqual(self.provider.name, "OpenAI Compatible | local-model")
+
+    def test_generate_response_reuses_connection(self):
+        history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+        for _ in range(3):
+            self.assertEqual(self.provider.generate_response("Question", history, None), "Hello world")
+
+        # The model listing and all requests share one kept-alive connection
+        self.assertEqual(self.server.connections, 1)
+        messages = self.server.requests[0]["messages"]
+        self.assertEqual([message["role"] for message in messages], ["system", "user", "assistant", "user"])
+        self.assertEqual(messages[-1]["content"], "Question")
+
+    def test_stream_response(self):
+        chunks = list(self.provider.stream_response("Question", [], None))
+
+        self.assertEqual(chunks, ["Hello", " world"])
+        self.assertTrue(self.server.requests[0]["stream"])
+
+    def test_pdf_file_part(self):
+        self.provider.generate_response("Summarize", [], make_pdf(["Paper text"]))
+
+        content = self.server.requests[0]["messages"][-1]["content"]
+        self.assertEqual(content[0]["type"], "file")
+        self.assertTrue(content[0]["file"]["file_data"].startswith("data:application/pdf;base64,"))
+
+    def test_pdf_text_fallback(self):
+        self.server.accepts_pdf = False
+        pdf_content = make_pdf(["Paper text"])
+        self.assertEqual(self.provider.generate_response("Summarize", [], pdf_content), "Hello world")
+        self.assertEqual(list(self.provider.stream_response("Summarize", [], pdf_content)), ["Hello", " world"])
+
+        # The rejected PDF is retried as text once, and later requests send the text right away
+        contents = [request["messages"][-1]["content"] for request in self.server.requests]
+        self.assertEqual(len(contents), 3)
+        self.assertIsInstance(contents[0], list)
+        for content in contents[1:]:
+            self.assertIn("<START | paper>Paper text", content)
+            self.assertTrue(content.endswith("Summarize"))
+
+    def test_pdf_text_is_provided_by_the_caller(self):
+        self.server.accepts_pdf = False
+        pdf_text = MagicMock(return_value="Ingested text")
+        self.provider.generate_response("Summarize", [], make_pdf(["Paper text"]), pdf_text=pdf_text)
+
+        # The caller's text is used instead of extracting it again
+        self.assertIn("<START | paper>Ingested text", self.server.requests[-1]["messages"][-1]["content"])
+        pdf_text.assert_called_once()
+
+    def test_unrelated_error_keeps_pdf_file_parts(self):
+        pdf_content = make_pdf(["Paper text"])
+        self.server.errors.append((400, {"error": "This model's maximum context length is 4096 tokens."}))
+        with self.assertRaises(httpx.HTTPStatusError):
+            self.provider.generate_response("Summarize", [], pdf_content)
+        self.provider.generate_response("Summarize", [], pdf_content)
+
+        # The failed request is not retried, and the next request still sends the PDF as a file part
+        contents = [request["messages"][-1]["content"] for request in self.server.requests]
+        self.assertEqual(len(contents), 2)
+        self.assertTrue(all(isinstance(content, list) for content in contents))
+
+
+class TestGoogleGemini(unittest.TestCase):
+    @patch("paper_pal.providers.genai.Client")
+    def test_missing_file(self, mock_client):
+        provider = GoogleGemini("test_api_key")
+        response = httpx.Response(403, json={"error": {"message": "You do not have permission to access the File x."}})
+        error = errors.ClientError(403, response)
+        mock_client.return_value.models.generate_content.side_effect = error
+
+        with self.assertRaises(FileNotFoundError):
+            provider.generate_response("Summarize", [], None, pdf_file="https://example.com/files/x")
+
+        # Without a file reference the error is passed on
+        with self.assertRaises(errors.ClientError):
+            provider.generate_response("Summarize", [], b"%PDF")
+
+
+class TestOpenAICompatibleLoadBalancing(unittest.TestCase):
+    def setUp(self):
+        self.servers = [StubServer(["local-model"]), StubServer(["local-model", "other-model"])]
+        self.provider = OpenAICompatible("test_api_key", base_urls=[server.url for server in self.servers])
+
+    def tearDown(self):
+        self.provider.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_least_loaded_server(self):
+        busy, idle = self.servers
+        busy.release.clear()
+        # Make sure the first request goes to the server that is kept busy
+        self.provider._in_flight[idle.url] += 1
+        thread = threading.Thread(target=self.provider.generate_response, args=("First", [], None))
+        thread.start()
+        self.assertTrue(busy.received.wait(timeout=5))
+        self.provider._in_flight[idle.url] -= 1
+
+        for _ in range(3):
+            self.provider.generate_response("Next", [], None)
+        busy.release.set()
+        thread.join(timeout=5)
+
+        self.assertEqual(len(busy.requests), 1)
+        self.assertEqual(len(idle.requests), 3)
+
+    def test_requests_are_spread_when_idle(self):
+        for _ in range(4):
+            self.provider.generate_response("Question", [], None)
+
+        self.assertEqual([len(server.requests) for server in self.servers], [2, 2])
+
+    def test_model_routing(self):
+        self.assertEqual(self.provider.list_available_models(), ["local-model", "other-model"])
+        self.provider.model = "other-model"
+        for _ in range(2):
+            self.provider.generate_response("Question", [], None)
+
+        self.assertEqual([len(server.requests) for server in self.servers], [0, 2])
+
+
+class TestOpenAICompatibleFailover(unittest.TestCase):
+    def setUp(self):
+        # A base URL on which nothing listens
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.dead_port = sock.getsockname()[1]
+        self.dead_url = f"http://127.0.0.1:{self.dead_port}/v1"
+        self.servers = [StubServer(["local-model"])]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def make_provider(self, base_urls: list[str]) -> OpenAICompatible:
+        # No kept-alive connections, so a stopped server cannot be reached anymore
+        client = httpx.Client(limits=httpx.Limits(max_keepalive_connections=0))
+        self.addCleanup(client.close)
+        return OpenAICompatible("test_api_key", base_urls=base_urls, client=client)
+
+    @patch("builtins.print")
+    def test_dead_base_url(self, mock_print):
+        live = self.servers[0]
+        provider = self.make_provider([self.dead_url, live.url])
+
+        self.assertEqual(provider.list_available_models(), ["local-model"])
+        for _ in range(3):
+            self.assertEqual(provider.generate_response("Question", [], None), "Hello world")
+        self.assertEqual(len(live.requests), 3)
+
+        # The dead server is queried again after the cooldown and used once it is up
+        provider.RETRY_AFTER = 0.0
+        self.servers.append(StubServer(["local-model"], port=self.dead_port))
+        for _ in range(4):
+            provider.generate_response("Question", [], None)
+        self.assertEqual([len(server.requests) for server in self.servers], [5, 2])
+
+    @patch("builtins.print")
+    def test_server_goes_down(self, mock_print):
+        self.servers.append(StubServer(["local-model"]))
+        provider = self.make_provider([server.url for server in self.servers])
+        down, up = self.servers
+        down.stop()
+
+        # Requests for the stopped server are sent to the other server, which serves all later requests
+        for _ in range(4):
+            self.assertEqual(list(provider.stream_response("Question", [], None)), ["Hello", " world"])
+        self.assertEqual((len(down.requests), len(up.requests)), (0, 4))
+        connect_errors = [call for call in mock_print.call_args_list if "Could not connect" in call.args[0]]
+        self.assertEqual(len(connect_errors), 1)
+
+        # If no server can be reached the connection error is raised
+        up.stop()
+        with self.assertRaises(httpx.ConnectError):
+            provider.generate_response("Question", [], None)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from helpers import make_pdf
+from paper_pal.references import CrossReferencer, Reference, ReferenceLibrary, parse_references
+
+PAPER_TEXT = """Introduction
+We build on prior work [1, 2, 3].
+References
+[1] A. Smith and B. Jones. Deep reinforcement learning for robots. In ICML, 2020.
+[2] C. Doe. Procedural generation of bench-
+marks. NeurIPS, 2019. doi:10.1234/bench.2019.
+[3] E. Roe. "An unavailable paper," Journal of Things, 2018.
+Appendix A
+[4] This is not a reference.
+"""
+
+
+class TestParseReferences(unittest.TestCase):
+    def test_bracketed_references(self):
+        references = parse_references(PAPER_TEXT)
+
+        # Entries after the appendix heading are ignored
+        self.assertEqual(len(references), 3)
+        self.assertEqual(references[0].title, "Deep reinforcement learning for robots")
+        self.assertIsNone(references[0].doi)
+
+        # Hyphenated line breaks are joined and DOIs are extracted
+        self.assertEqual(references[1].title, "Procedural generation of benchmarks")
+        self.assertEqual(references[1].doi, "10.1234/bench.2019")
+
+        # Quoted titles take precedence
+        self.assertEqual(references[2].title, "An unavailable paper")
+
+    def test_author_year_references(self):
+        text = (
+            "Bibliography\n"
+            "Smith, J. (2021). Learning to read papers. Journal of Reading, 3(2), 1-10.\n\n"
+            "Doe, A., and Roe, B. (2019). Another paper title. Proceedings.\n"
+        )
+        references = parse_references(text)
+
+        self.assertEqual([ref.title for ref in references], ["Learning to read papers", "Another paper title"])
+
+    def test_no_references_section(self):
+        self.assertEqual(parse_references("Just some text without a bibliography."), [])
+
+
+class TestReferenceLibrary(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_resolve_from_pdf_metadata(self):
+        (self.directory / "a.pdf").write_bytes(make_pdf(["Some text"], title="Deep Reinforcement Learning for Robots"))
+        (self.directory / "b.pdf").write_bytes(make_pdf(["Procedural things", "DOI: 10.1234/BENCH.2019"]))
+        library = ReferenceLibrary(self.directory)
+
+        by_title = Reference(raw="...", title="Deep reinforcement learning for robots.")
+        by_doi = Reference(raw="...", title="Something else", doi="10.1234/bench.2019")
+        missing = Reference(raw="...", title="An unavailable paper")
+        self.assertEqual(library.resolve(by_title), self.directory / "a.pdf")
+        self.assertEqual(library.resolve(by_doi), self.directory / "b.pdf")
+        self.assertIsNone(library.resolve(missing))
+
+    def test_resolve_from_index_file(self):
+        index = [{"path": "paper.pdf", "title": "Indexed Paper Title", "doi": None}]
+        (self.directory / "index.json").write_text(json.dumps(index), encoding="utf-8")
+        library = ReferenceLibrary(self.directory)
+
+        reference = Reference(raw="...", title="Indexed paper title")
+        self.assertEqual(library.resolve(reference), self.directory / "paper.pdf")
+
+    def test_malformed_index_file(self):
+        (self.directory / "a.pdf").write_bytes(make_pdf(["Some text"], title="Deep Reinforcement Learning"))
+        for index in ("not json", json.dumps([{"title": "No path"}]), json.dumps(["not an object"])):
+            (self.directory / "index.json").write_text(index, encoding="utf-8")
+            library = ReferenceLibrary(self.directory)
+
+            # Falls back to indexing the PDFs
+            reference = Reference(raw="...", title="Deep reinforcement learning")
+            with patch("builtins.print"):
+                self.assertEqual(library.resolve(reference), self.directory / "a.pdf")
+
+    def test_index_is_rebuilt_when_the_library_changes(self):
+        library = ReferenceLibrary(self.directory)
+        reference = Reference(raw="...", title="Deep reinforcement learning")
+        self.assertIsNone(library.resolve(reference))
+
+        # A PDF added to the directory is found
+        (self.directory / "a.pdf").write_bytes(make_pdf(["Some text"], title="Deep Reinforcement Learning"))
+        os.utime(self.directory, ns=(0, 1))
+        self.assertEqual(library.resolve(reference), self.directory / "a.pdf")
+
+        # A changed index file is read again
+        index = [{"path": "b.pdf", "title": "Deep Reinforcement Learning", "doi": None}]
+        (self.directory / "index.json").write_text(json.dumps(index), encoding="utf-8")
+        os.utime(self.directory / "index.json", ns=(0, 2))
+        self.assertEqual(library.resolve(reference), self.directory / "b.pdf")
+
+        # An unchanged library is not indexed again
+        with patch.object(library, "_build_index") as build_index:
+            library.resolve(reference)
+        build_index.assert_not_called()
+
+    def test_missing_directory(self):
+        library = ReferenceLibrary(self.directory / "missing")
+        self.assertIsNone(library.resolve(Reference(raw="...", title="Any title")))
+
+
+class TestCrossReferencer(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        directory = Path(self._tmp.name)
+        (directory / "a.pdf").write_bytes(make_pdf(["A"], title="Deep reinforcement learning for robots"))
+        (directory / "b.pdf").write_bytes(make_pdf(["B", "10.1234/bench.2019"]))
+        self.library = ReferenceLibrary(directory)
+        self.paper = make_pdf(PAPER_TEXT.splitlines())
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_summaries_run_concurrently_and_are_cached(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def generate_response(prompt, history, pdf_content):
+            # Both requests must be in flight at the same time to pass the barrier
+            barrier.wait()
+            return "summary of " + ("A" if b"(A)" in pdf_content else "B")
+
+        provider = MagicMock()
+        provider.name = "Fake | model"
+        provider.generate_response.side_effect = generate_response
+        cross_referencer = CrossReferencer(self.library, max_workers=2)
+
+        results = dict((ref.label, summary) for ref, summary in cross_referencer.summarize(provider, self.paper))
+        self.assertEqual(
+            results,
+            {
+                "Deep reinforcement learning for robots": "summary of A",
+                "Procedural generation of benchmarks": "summary of B",
+            },
+        )
+
+        # A second run is served from the cache
+        results = list(cross_referencer.summarize(provider, self.paper))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(provider.generate_response.call_count, 2)
+
+    def test_summaries_are_yielded_as_they_finish(self):
+        def generate_response(prompt, history, pdf_content):
+            if b"(A)" in pdf_content:
+                time.sleep(0.2)
+                return "slow"
+            return "fast"
+
+        provider = MagicMock()
+        provider.name = "Fake | model"
+        provider.generate_response.side_effect = generate_response
+        cross_referencer = CrossReferencer(self.library, max_workers=2)
+
+        summaries = [summary for _, summary in cross_referencer.summarize(provider, self.paper)]
+        self.assertEqual(summaries, ["fast", "slow"])
+
+    def test_failed_summary_is_reported(self):
+        provider = MagicMock()
+        provider.name = "Fake | model"
+        provider.generate_response.side_effect = RuntimeError("quota exceeded")
+        cross_referencer = CrossReferencer(self.library)
+
+        for _, summary in cross_referencer.summarize(provider, self.paper):
+            self.assertIn("quota exceeded", summary)
+
+    def test_unreadable_paper_raises(self):
+        # The caller reports the error, nothing is requested from the provider
+        provider = MagicMock()
+        cross_referencer = CrossReferencer(self.library)
+
+        with self.assertRaises(Exception):
+            list(cross_referencer.summarize(provider, b"not a pdf"))
+        provider.generate_response.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
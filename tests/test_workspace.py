@@ -0,0 +1,241 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from helpers import make_pdf
+from paper_pal.workspace import Paper, Workspace, display_names
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.paths = []
+        for name in ("a", "b", "c"):
+            path = Path(self._tmp.name) / f"{name}.pdf"
+            path.write_bytes(make_pdf([f"Paper {name.upper()}"]))
+            self.paths.append(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_lazy_loading(self):
+        workspace = Workspace()
+        paper = workspace.add(self.paths[0])
+
+        # Adding a paper does not read it, and adding it again returns the same paper
+        self.assertFalse(paper.loaded)
+        self.assertIs(workspace.add(self.paths[0]), paper)
+
+        workspace.open(paper)
+        self.assertTrue(paper.loaded)
+        self.assertIn(b"Paper A", paper.data)
+        self.assertEqual(len(paper.hash), 64)
+
+    def test_lru_eviction(self):
+        workspace = Workspace(capacity=2)
+        a, b, c = (workspace.add(path) for path in self.paths)
+
+        workspace.open(a)
+        workspace.open(b)
+        workspace.open(a)
+        workspace.open(c)
+
+        # b was the least recently used paper
+        self.assertEqual([paper.loaded for paper in (a, b, c)], [True, False, True])
+        self.assertEqual(workspace.papers, [a, b, c])
+
+        # An evicted paper is loaded again when used
+        self.assertIn(b"Paper B", b.data)
+
+    def test_file_reference_is_uploaded_once(self):
+        workspace = Workspace()
+        paper = workspace.add(self.paths[0])
+        provider = MagicMock()
+        provider.upload_pdf.return_value = "files/a"
+
+        self.assertEqual(paper.file_reference(provider), "files/a")
+        self.assertEqual(paper.file_reference(provider), "files/a")
+        provider.upload_pdf.assert_called_once()
+
+        # Unloading keeps the file reference
+        paper.unload()
+        self.assertEqual(paper.file_reference(provider), "files/a")
+        provider.upload_pdf.assert_called_once()
+
+    @patch("paper_pal.workspace.time.monotonic")
+    def test_expired_file_reference_is_uploaded_again(self, mock_monotonic):
+        paper = Workspace().add(self.paths[0])
+        provider = MagicMock()
+        provider.upload_pdf.side_effect = ["files/a", "files/b"]
+
+        mock_monotonic.return_value = 0.0
+        self.assertEqual(paper.file_reference(provider), "files/a")
+        mock_monotonic.return_value = Paper.UPLOAD_TTL
+        self.assertEqual(paper.file_reference(provider), "files/a")
+        mock_monotonic.return_value = Paper.UPLOAD_TTL + 1
+        self.assertEqual(paper.file_reference(provider), "files/b")
+
+    def test_missing_file_is_uploaded_again(self):
+        paper = Workspace().add(self.paths[0])
+        provider = MagicMock()
+        provider.upload_pdf.side_effect = ["files/a", "files/b"]
+        provider.generate_response.side_effect = [FileNotFoundError("files/a"), "response"]
+
+        self.assertEqual(paper.generate_response(provider, "Question", []), "response")
+        pdf_files = [call.kwargs["pdf_file"] for call in provider.generate_response.call_args_list]
+        self.assertEqual(pdf_files, ["files/a", "files/b"])
+
+        # A stream is not retried once chunks were yielded
+        provider.stream_response.side_effect = lambda *args, **kwargs: self._fail_after_first_chunk()
+        with self.assertRaises(FileNotFoundError):
+            list(paper.stream_response(provider, "Question", []))
+        self.assertEqual(provider.stream_response.call_count, 1)
+
+    @staticmethod
+    def _fail_after_first_chunk():
+        yield "Hello"
+        raise FileNotFoundError("files/b")
+
+    def test_text_is_cached_until_unloaded(self):
+        paper = Workspace().add(self.paths[0])
+        provider = MagicMock()
+        provider.upload_pdf.return_value = None
+        provider.generate_response.side_effect = lambda *args, pdf_text, **kwargs: pdf_text()
+
+        with patch("paper_pal.workspace.extract_text", return_value="Paper A") as mock_extract_text:
+            for _ in range(2):
+                self.assertEqual(paper.generate_response(provider, "Question", []), "Paper A")
+            mock_extract_text.assert_called_once()
+
+            paper.unload()
+            self.assertFalse(paper.loaded)
+            self.assertEqual(paper.text, "Paper A")
+            self.assertEqual(mock_extract_text.call_count, 2)
+
+        # Without uploads the PDF content is sent
+        self.assertIn(b"Paper A", provider.generate_response.call_args.args[2])
+
+    def test_remove(self):
+        workspace = Workspace()
+        paper = workspace.open(workspace.add(self.paths[0]))
+        provider = MagicMock()
+        provider.upload_pdf.return_value = "files/a"
+        paper.file_reference(provider)
+        workspace.remove(paper)
+
+        self.assertEqual(workspace.papers, [])
+        self.assertFalse(paper.loaded)
+        provider.delete_pdf.assert_called_once_with("files/a")
+
+    def test_display_names(self):
+        workspace = Workspace()
+        x, y = Path(self._tmp.name) / "x", Path(self._tmp.name) / "y"
+        x.mkdir()
+        y.mkdir()
+        papers = [workspace.add(self.paths[0]), workspace.add(x / "paper.pdf"), workspace.add(y / "paper.pdf")]
+
+        self.assertEqual(display_names(papers), ["a.pdf", "x/paper.pdf", "y/paper.pdf"])
+
+    def test_invalid_capacity(self):
+        with self.assertRaises(ValueError):
+            Workspace(capacity=0)
+
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.workspace = Workspace(max_workers=3)
+        for name in ("a", "b", "c"):
+            path = Path(self._tmp.name) / f"{name}.pdf"
+            path.write_bytes(make_pdf([f"Paper {name.upper()}"]))
+            self.workspace.add(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_extractions_run_in_parallel_and_are_merged(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def generate_response(prompt, history, pdf_content, pdf_file=None, pdf_text=None):
+            if pdf_content is None:
+                return "merged"
+            # All three extractions must be in flight at the same time to pass the barrier
+            barrier.wait()
+            return "findings of " + ("A" if b"Paper A" in pdf_content else "other")
+
+        provider = MagicMock()
+        provider.upload_pdf.return_value = None
+        provider.generate_response.side_effect = generate_response
+
+        response = self.workspace.compare(provider, "Which is best?")
+        self.assertEqual(response, "merged")
+        self.assertEqual(provider.generate_response.call_count, 4)
+
+        # The merge request contains every extraction but no PDF
+        merge_prompt, history, pdf_content = provider.generate_response.call_args.args
+        self.assertIsNone(pdf_content)
+        self.assertIn("Which is best?", merge_prompt)
+        self.assertIn("**Paper: a.pdf**\nfindings of A", merge_prompt)
+        self.assertIn("**Paper: c.pdf**\nfindings of other", merge_prompt)
+
+    def test_uploaded_files_are_referenced(self):
+        provider = MagicMock()
+        provider.upload_pdf.side_effect = lambda data: "files/" + data[-10:].hex()
+        provider.generate_response.return_value = "response"
+        papers = self.workspace.papers[:2]
+
+        self.workspace.compare(provider, papers=papers)
+        self.workspace.compare(provider, papers=papers)
+
+        self.assertEqual(provider.upload_pdf.call_count, 2)
+        for call in provider.generate_response.call_args_list[:2]:
+            self.assertIsNone(call.args[2])
+            self.assertTrue(call.kwargs["pdf_file"].startswith("files/"))
+
+    def test_evicted_papers_are_not_uploaded_again(self):
+        workspace = Workspace(capacity=1)
+        papers = [workspace.add(paper.path) for paper in self.workspace.papers[:2]]
+        provider = MagicMock()
+        provider.upload_pdf.side_effect = lambda data: f"files/{provider.upload_pdf.call_count}"
+        provider.generate_response.return_value = "response"
+
+        for _ in range(3):
+            workspace.compare(provider, papers=papers)
+
+        self.assertEqual(provider.upload_pdf.call_count, 2)
+
+    def test_papers_with_the_same_name(self):
+        paths = []
+        for folder in ("x", "y"):
+            path = Path(self._tmp.name) / folder / "paper.pdf"
+            path.parent.mkdir()
+            path.write_bytes(make_pdf([f"Paper {folder}"]))
+            paths.append(path)
+        workspace = Workspace()
+        papers = [workspace.add(path) for path in paths]
+        provider = MagicMock()
+        provider.upload_pdf.return_value = None
+        provider.generate_response.side_effect = lambda prompt, history, pdf_content, pdf_file=None, pdf_text=None: (
+            "merged" if pdf_content is None else "findings"
+        )
+
+        workspace.compare(provider, papers=papers)
+
+        merge_prompt = provider.generate_response.call_args.args[0]
+        self.assertIn("**Paper: x/paper.pdf**", merge_prompt)
+        self.assertIn("**Paper: y/paper.pdf**", merge_prompt)
+
+    def test_failed_extraction_is_reported(self):
+        provider = MagicMock()
+        provider.upload_pdf.side_effect = RuntimeError("upload failed")
+        provider.generate_response.return_value = "merged"
+
+        self.assertEqual(self.workspace.compare(provider), "merged")
+        merge_prompt = provider.generate_response.call_args.args[0]
+        self.assertEqual(merge_prompt.count("upload failed"), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()